@@ -1,12 +1,17 @@
-from flask import Flask, request, render_template_string, redirect, url_for, send_from_directory
-from threading import Thread
-import requests, time, os, itertools, random
+from flask import Flask, request, redirect, url_for, send_from_directory, jsonify, abort, g, Response
+from threading import Thread, Lock
+import requests, time, os, itertools, random, functools, hashlib, tempfile, multiprocessing, json, re, secrets, sqlite3, cProfile, contextlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 from werkzeug.utils import secure_filename
-from PIL import Image
+from PIL import Image, features
 
 app = Flask(__name__)
 app.secret_key = "change_this_secret_in_prod"
+# set behind nginx/apache to let the front server send files (X-Sendfile) instead of the worker
+app.config["USE_X_SENDFILE"] = os.environ.get("USE_X_SENDFILE") == "1"
 
 UPLOAD_FOLDER = "uploads"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -18,41 +23,199 @@ VIDEO_LIST_PATH = os.path.join(UPLOAD_FOLDER, "video.txt")
 CAPTION_PATH = os.path.join(UPLOAD_FOLDER, "caption.txt")
 TAGS_PATH = os.path.join(UPLOAD_FOLDER, "tags.txt")  # unlimited tags/mentions
 COMMENTS_PATH = os.path.join(UPLOAD_FOLDER, "comments.txt")  # comments to post line-by-line
+ASCII_CACHE_DIR = os.path.join(UPLOAD_FOLDER, ".ascii_cache")  # rendered ASCII art, keyed by content hash
+ASCII_CACHE_MAX_BYTES = int(os.environ.get("ASCII_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+VIDEO_EXTS = ('.mp4','.mov','.mkv','.avi')
+MEDIA_MAX_AGE = 7 * 24 * 3600  # Cache-Control max-age for /uploads URLs versioned with ?v=<sha256>
+FILES_PAGE_SIZE = 200  # dashboard media list page size
+MANIFEST_PATH = os.path.join(UPLOAD_FOLDER, ".manifest.sqlite3")  # media manifest (photo/video entries)
+THUMB_DIR = os.path.join(UPLOAD_FOLDER, ".thumbs")  # cached dashboard thumbnails
+THUMB_SIZE = (160, 160)
+IMAGE_EXTS = ('.jpg','.jpeg','.png','.gif','.webp','.bmp','.tif','.tiff')
+CHUNKED_DIR = os.path.join(UPLOAD_FOLDER, ".partial")  # in-progress chunked uploads, same filesystem as the final files
+CHUNKED_MAX_AGE = 24 * 3600  # partial uploads untouched for this long are discarded
+PROFILE_DIR = os.path.join(UPLOAD_FOLDER, ".profiles")  # cProfile dumps of single requests
+PROFILE_REQUESTS = os.environ.get("PROFILE_REQUESTS") == "1"  # opt-in: then ?_profile=1 profiles that request
 
 valid_tokens = []
 token_index = 0
 is_running = False
 posting_thread = None
 current_status = "Stopped"
-recent_logs = []
+LOG_CAPACITY = 500  # bigger log buffer
+recent_logs = deque(maxlen=LOG_CAPACITY)  # (seq, entry), oldest first
+_log_seq = itertools.count(1)
+_log_lock = Lock()
 
 # Comments iterator (cycle through lines)
 _comments_iter = None
-_comments_last_mtime = None
+_comments_version = None
 
 def log(msg):
     ts = time.strftime("%Y-%m-%d %H:%M:%S")
     entry = f"[{ts}] {msg}"
     print(entry)
-    global recent_logs
-    recent_logs = ([entry] + recent_logs)[:500]  # bigger log buffer
+    with _log_lock:
+        recent_logs.append((next(_log_seq), entry))
+
+def logs_since(seq=0):
+    """Entries with a sequence number greater than `seq`, oldest first."""
+    with _log_lock:
+        return [e for e in recent_logs if e[0] > seq]
+
+# ---------------------------
+# Metrics (in-memory, Prometheus text format at /metrics)
+# ---------------------------
+# Per process: with several gunicorn workers each one reports its own numbers.
+METRIC_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+_histograms = {}  # (name, labels) -> [per-bucket counts..., +Inf count, sum]
+_metrics_lock = Lock()
+
+def observe(name, seconds, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _metrics_lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [0] * (len(METRIC_BUCKETS) + 1) + [0.0]
+        for i, b in enumerate(METRIC_BUCKETS):
+            if seconds <= b:
+                h[i] += 1; break
+        else:
+            h[len(METRIC_BUCKETS)] += 1
+        h[-1] += seconds
+
+def timed(fn):
+    """Record call latency of an internal hot path as autopost_function_duration_seconds."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            observe("autopost_function_duration_seconds", time.perf_counter() - t0, function=fn.__name__)
+    return wrapper
+
+def _fmt_labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items: return ""
+    return "{" + ",".join('%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in items) + "}"
+
+def render_metrics():
+    out = []
+    with _metrics_lock:
+        hists = sorted((k, list(v)) for k, v in _histograms.items())
+    seen = set()
+    for (name, labels), h in hists:
+        if name not in seen:
+            out.append(f"# TYPE {name} histogram"); seen.add(name)
+        cum = 0
+        for b, n in zip(METRIC_BUCKETS + ("+Inf",), h[:-1]):
+            cum += n
+            out.append(f"{name}_bucket{_fmt_labels(labels, le=b)} {cum}")
+        out.append(f"{name}_sum{_fmt_labels(labels)} {h[-1]:.6f}")
+        out.append(f"{name}_count{_fmt_labels(labels)} {cum}")
+    out.append("# TYPE autopost_ascii_cache_total counter")
+    for k, v in ascii_cache_stats.items():
+        out.append(f'autopost_ascii_cache_total{{result="{k}"}} {v}')
+    out.append("# TYPE autopost_render_jobs gauge")
+    states = render_states()
+    for state in ("queued", "rendering", "ready", "failed"):
+        out.append(f'autopost_render_jobs{{state="{state}"}} {sum(1 for s in states.values() if s == state)}')
+    out.append("# TYPE autopost_log_entries_total counter")
+    with _log_lock:
+        out.append(f"autopost_log_entries_total {recent_logs[-1][0] if recent_logs else 0}")
+    out.append("# TYPE autopost_worker_running gauge")
+    out.append(f"autopost_worker_running {1 if is_running else 0}")
+    return "\n".join(out) + "\n"
+
+@app.before_request
+def _metrics_before():
+    g._t0 = time.perf_counter()
+    g._profiler = None
+    if PROFILE_REQUESTS and request.args.get("_profile") == "1":
+        try:
+            g._profiler = cProfile.Profile(); g._profiler.enable()
+        except ValueError as e:  # another request is already being profiled
+            g._profiler = None; log(f"Profiling skipped: {e}")
+
+@app.after_request
+def _metrics_after(response):
+    observe("autopost_request_duration_seconds", time.perf_counter() - g.get("_t0", time.perf_counter()),
+            endpoint=request.endpoint or "unmatched", method=request.method, status=response.status_code)
+    path = _finish_profile()
+    if path: response.headers["X-Profile"] = path
+    return response
+
+@app.teardown_request
+def _metrics_teardown(exc):
+    # after_request is skipped when an exception propagates; never leave cProfile running
+    _finish_profile()
+
+def _finish_profile():
+    """Stop this request's profiler (if any) and dump it; returns the .prof path."""
+    prof = g.pop("_profiler", None)
+    if prof is None:
+        return None
+    prof.disable()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{request.endpoint or 'unmatched'}-{secrets.token_hex(3)}.prof")
+    prof.dump_stats(path)
+    log(f"Request profile written: {path}")
+    return path
 
 def save_text_file(path, content):
     with open(path, "w", encoding="utf-8") as f:
         if content: f.write(content.strip() + ("\n" if not content.endswith("\n") else ""))
 
+@timed
 def append_list_file(path, items):
-    existing = []
-    if os.path.exists(path):
-        existing = [l.strip() for l in open(path,"r",encoding="utf-8") if l.strip()]
-    new = existing + items
-    with open(path,"w",encoding="utf-8") as f:
-        for i in new: f.write(i+"\n")
-
-def load_lines(path):
-    if not os.path.exists(path): return []
+    with open(path,"a+b") as f:
+        # O(1): only the last byte of the existing list is read, to fix a missing trailing newline
+        f.seek(0, os.SEEK_END)
+        if f.tell():
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n": f.write(b"\n")
+        f.write("".join(i+"\n" for i in items).encode("utf-8"))
+
+# ---------------------------
+# Cached readers for uploads/*.txt
+# ---------------------------
+# Parsed lines are memoized per path and keyed by (mtime_ns, size), so re-reading
+# an unchanged file costs one stat().
+_lines_cache = {}  # path -> ((mtime_ns, size), lines)
+_lines_cache_lock = Lock()
+
+def file_version(path):
+    """(mtime_ns, size) of a file, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def iter_lines(path):
+    """Lazily yield stripped, non-empty lines without loading (or caching) the whole file."""
+    if not os.path.exists(path): return
     with open(path,"r",encoding="utf-8") as f:
-        return [l.strip() for l in f if l.strip()]
+        for l in f:
+            l = l.strip()
+            if l: yield l
+
+@timed
+def load_lines(path, fresh=False):
+    """Stripped, non-empty lines of `path` as a tuple; re-parsed only when the file changes."""
+    version = file_version(path)
+    if version is None:
+        with _lines_cache_lock: _lines_cache.pop(path, None)
+        return ()
+    with _lines_cache_lock:
+        cached = _lines_cache.get(path)
+    if cached and cached[0] == version and not fresh:
+        return cached[1]
+    lines = tuple(iter_lines(path))
+    with _lines_cache_lock:
+        _lines_cache[path] = (version, lines)
+    return lines
 
 def validate_tokens_file(path):
     tokens = load_lines(path)
@@ -79,25 +242,493 @@ def next_token():
     return token
 
 def get_tags():
-    if os.path.exists(TAGS_PATH):
-        lines = [l.strip() for l in open(TAGS_PATH,"r",encoding="utf-8") if l.strip()]
-        return ",".join(lines)
-    return ""
+    return ",".join(load_lines(TAGS_PATH))
+
+# ---------------------------
+# ASCII rendering engine
+# ---------------------------
+ASCII_CHARSET = "@%#*+=-:. "
+ASCII_WIDTH = 80
+ASCII_FAILED = "[Image ASCII Conversion Failed]"
+
+@functools.lru_cache(maxsize=32)
+def _ascii_lut(charset):
+    """
+    Build the 256-entry point() table for a charset plus an optional str.translate map.
+    Bucket width is 256//len(charset) (25 for the default charset, i.e. pixel//25),
+    the top bucket is clamped so bright pixels (250-255) map to the last char.
+    Latin-1 charsets map straight to their byte values; anything else maps to an
+    index that is translated after decoding.
+    """
+    n = len(charset)
+    step = max(256 // n, 1)
+    idx = [min(p // step, n - 1) for p in range(256)]
+    try:
+        codes = charset.encode("latin-1")
+        return [codes[i] for i in idx], None
+    except UnicodeEncodeError:
+        return idx, {i: c for i, c in enumerate(charset)}
+
+def _ascii_resize(img, width, fast_decode=True):
+    """
+    Scale to `width` keeping aspect ratio. With fast_decode, JPEGs are decoded at a
+    reduced DCT scale via draft() and the resize runs reduce() first (reducing_gap),
+    so large photos never get decoded at full resolution.
+    """
+    wpercent = (width/float(img.size[0]))
+    hsize = int((float(img.size[1])*float(wpercent)))
+    if fast_decode:
+        img.draft('L', (width, hsize))
+    img = img.convert('L')
+    if fast_decode:
+        return img.resize((width, hsize), reducing_gap=3.0)
+    return img.resize((width, hsize))
+
+def render_ascii(img, width=ASCII_WIDTH, charset=ASCII_CHARSET, fast_decode=True):
+    """Render an open PIL image to ASCII art, one line per pixel row."""
+    lut, trans = _ascii_lut(charset)
+    img = _ascii_resize(img, width, fast_decode)
+    text = img.point(lut).tobytes().decode("latin-1")
+    if trans: text = text.translate(trans)
+    return "\n".join([text[i:i+width] for i in range(0,len(text),width)])
 
-def image_to_ascii(path,width=80):
-    chars = "@%#*+=-:. "
+@timed
+def image_to_ascii(path,width=ASCII_WIDTH,charset=ASCII_CHARSET,fast_decode=True):
+    """
+    Convert an image file to ASCII art. fast_decode=False skips draft()/reduce()
+    and reproduces the legacy per-pixel output exactly.
+    """
     try:
-        img = Image.open(path).convert('L')
-        wpercent = (width/float(img.size[0]))
-        hsize = int((float(img.size[1])*float(wpercent)))
-        img = img.resize((width, hsize))
-        pixels = img.getdata()
-        ascii_str = "".join([chars[pixel//25] for pixel in pixels])
-        ascii_lines = [ascii_str[i:i+width] for i in range(0,len(ascii_str),width)]
-        return "\n".join(ascii_lines)
+        with Image.open(path) as img:
+            return render_ascii(img, width, charset, fast_decode)
     except Exception as e:
         log(f"ASCII conversion failed: {e}")
-        return "[Image ASCII Conversion Failed]"
+        return ASCII_FAILED
+
+# ---------------------------
+# ASCII render cache (content-addressed, on disk)
+# ---------------------------
+ascii_cache_stats = {"hits": 0, "misses": 0}
+_ascii_cache_lock = Lock()
+_ascii_cache_bytes = None  # total size of ASCII_CACHE_DIR, scanned lazily
+
+@timed
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _ascii_cache_path(digest, width, charset):
+    key = hashlib.sha256(f"{digest}|{width}|{charset}".encode("utf-8")).hexdigest()
+    return os.path.join(ASCII_CACHE_DIR, key + ".txt")
+
+def _ascii_cache_evict(incoming):
+    """
+    Drop least-recently-used entries (oldest mtime, bumped on every hit) until
+    `incoming` more bytes fit under ASCII_CACHE_MAX_BYTES. Caller holds the lock.
+    """
+    global _ascii_cache_bytes
+    if _ascii_cache_bytes is None:
+        _ascii_cache_bytes = sum(e.stat().st_size for e in os.scandir(ASCII_CACHE_DIR) if e.is_file())
+    if _ascii_cache_bytes + incoming <= ASCII_CACHE_MAX_BYTES:
+        return
+    entries = sorted((e.stat().st_mtime, e.stat().st_size, e.path) for e in os.scandir(ASCII_CACHE_DIR) if e.is_file())
+    _ascii_cache_bytes = sum(e[1] for e in entries)
+    for _, size, p in entries:
+        if _ascii_cache_bytes + incoming <= ASCII_CACHE_MAX_BYTES: break
+        try:
+            os.remove(p); _ascii_cache_bytes -= size
+        except OSError: pass
+
+def ascii_cache_trim():
+    """Re-scan ASCII_CACHE_DIR (other processes may have written to it) and evict down to the cap."""
+    global _ascii_cache_bytes
+    with _ascii_cache_lock:
+        _ascii_cache_bytes = None
+        try:
+            _ascii_cache_evict(0)
+        except FileNotFoundError: pass
+
+def _ascii_cache_store(cache_path, text, evict=True):
+    """
+    Write atomically: temp file in the cache dir, then os.replace(). Pool
+    processes pass evict=False; their size counter would be stale, so the
+    parent trims with ascii_cache_trim() instead.
+    """
+    global _ascii_cache_bytes
+    data = text.encode("utf-8")
+    with _ascii_cache_lock:
+        if evict: _ascii_cache_evict(len(data))
+        fd, tmp = tempfile.mkstemp(dir=ASCII_CACHE_DIR, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f: f.write(data)
+            os.replace(tmp, cache_path)
+            if _ascii_cache_bytes is not None: _ascii_cache_bytes += len(data)
+        except Exception:
+            if os.path.exists(tmp): os.remove(tmp)
+            raise
+
+@timed
+def cached_image_to_ascii(path, width=ASCII_WIDTH, charset=ASCII_CHARSET, evict=True):
+    """
+    image_to_ascii() behind the on-disk cache. A hit costs one hash of the file,
+    so unchanged images are never decoded again across restarts.
+    """
+    os.makedirs(ASCII_CACHE_DIR, exist_ok=True)
+    try:
+        cache_path = _ascii_cache_path(file_digest(path), width, charset)
+    except OSError as e:
+        log(f"ASCII cache hash failed: {e}")
+        return image_to_ascii(path, width, charset)
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            text = f.read()
+        os.utime(cache_path)  # LRU bump
+        with _ascii_cache_lock: ascii_cache_stats["hits"] += 1
+        return text
+    except FileNotFoundError:
+        pass
+    with _ascii_cache_lock: ascii_cache_stats["misses"] += 1
+    text = image_to_ascii(path, width, charset)
+    if text != ASCII_FAILED:
+        try:
+            _ascii_cache_store(cache_path, text, evict)
+        except OSError as e:
+            log(f"ASCII cache write failed: {e}")
+    return text
+
+# ---------------------------
+# Dashboard thumbnails
+# ---------------------------
+THUMB_FORMAT, THUMB_EXT = ("WEBP", ".webp") if features.check("webp") else ("JPEG", ".jpg")
+
+def thumbnail_path(name):
+    """
+    Cache path for `name`'s thumbnail: one subdirectory per source name, one file
+    per source (mtime, size), so replaced files get a new thumbnail.
+    """
+    version = file_version(os.path.join(UPLOAD_FOLDER, name))
+    if version is None:
+        return None
+    name_key = hashlib.sha256(name.encode("utf-8")).hexdigest()[:32]
+    key = hashlib.sha256(f"{version[0]}|{version[1]}|{THUMB_SIZE}".encode("utf-8")).hexdigest()[:32]
+    return os.path.join(THUMB_DIR, name_key, key + THUMB_EXT)
+
+@timed
+def make_thumbnail(name):
+    """
+    Return the cached thumbnail path for an uploaded image, creating it if needed.
+    draft() lets JPEGs decode at a reduced scale, then thumbnail() finishes the
+    resize; the result is written atomically. Returns None for non-images.
+    """
+    if not name.lower().endswith(IMAGE_EXTS):
+        return None
+    path = thumbnail_path(name)
+    if path is None or os.path.exists(path):
+        return path
+    thumb_dir = os.path.dirname(path)
+    os.makedirs(thumb_dir, exist_ok=True)
+    with Image.open(os.path.join(UPLOAD_FOLDER, name)) as img:
+        img.draft("RGB", THUMB_SIZE)
+        img = img.convert("RGB")
+        img.thumbnail(THUMB_SIZE, reducing_gap=2.0)
+        fd, tmp = tempfile.mkstemp(dir=thumb_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f: img.save(f, THUMB_FORMAT, quality=80)
+            os.replace(tmp, path)
+        except Exception:
+            if os.path.exists(tmp): os.remove(tmp)
+            raise
+    # drop thumbnails of earlier versions of this name
+    for e in os.scandir(thumb_dir):
+        if e.path != path and e.name.endswith(THUMB_EXT):
+            try: os.remove(e.path)
+            except OSError: pass
+    return path
+
+# ---------------------------
+# Media manifest (SQLite)
+# ---------------------------
+# One row per photo/video: name, type, size, sha256 and the caption index the
+# worker pairs it with. Appends are single INSERTs inside BEGIN IMMEDIATE, so
+# concurrent uploads serialize instead of losing each other's entries, and
+# identical content (same sha256) is only recorded once. photo.txt / video.txt
+# are imported on first use and afterwards only appended to as a readable mirror.
+# Schema setup and the import run once per process; after that requests borrow
+# an already-open connection from a small pool (the threaded dev server starts
+# a thread per request, so per-thread connections would reconnect every time).
+MANIFEST_POOL_SIZE = 8
+_manifest_pool = []  # idle connections
+_manifest_ready = False
+_manifest_lock = Lock()
+
+MANIFEST_SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    type TEXT NOT NULL,
+    size INTEGER,
+    sha256 TEXT UNIQUE,
+    caption_index INTEGER NOT NULL,
+    added REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS media_type_name ON media(type, name);
+CREATE INDEX IF NOT EXISTS media_type_caption ON media(type, caption_index);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+def _manifest_open():
+    conn = sqlite3.connect(MANIFEST_PATH, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def _manifest_setup():
+    global _manifest_ready
+    with _manifest_lock:
+        if _manifest_ready: return
+        conn = _manifest_open()
+        conn.execute("PRAGMA journal_mode=WAL")  # persistent, stored in the database file
+        conn.executescript(MANIFEST_SCHEMA)
+        _manifest_import_lists(conn)
+        pending = conn.execute("SELECT COUNT(*) FROM media WHERE size IS NULL").fetchone()[0]
+        _manifest_pool.append(conn)
+        _manifest_ready = True
+    if pending:
+        Thread(target=_manifest_backfill, daemon=True).start()
+
+def _manifest_close():
+    """Close pooled connections and forget the setup, e.g. after UPLOAD_FOLDER moved (benchmarks)."""
+    global _manifest_ready
+    with _manifest_lock:
+        while _manifest_pool: _manifest_pool.pop().close()
+        _manifest_ready = False
+
+@contextlib.contextmanager
+def _manifest_conn():
+    if not _manifest_ready: _manifest_setup()
+    with _manifest_lock:
+        conn = _manifest_pool.pop() if _manifest_pool else None
+    if conn is None: conn = _manifest_open()
+    try:
+        yield conn
+    finally:
+        with _manifest_lock:
+            if len(_manifest_pool) < MANIFEST_POOL_SIZE:
+                _manifest_pool.append(conn); conn = None
+        if conn is not None: conn.close()
+
+def _media_type(name):
+    return "video" if name.lower().endswith(VIDEO_EXTS) else "photo"
+
+def _media_stat(name, digest=None):
+    """(size, sha256) of an upload; the file is only hashed when no digest is passed in."""
+    full = os.path.join(UPLOAD_FOLDER, name)
+    try:
+        return os.path.getsize(full), digest or file_digest(full)
+    except OSError:
+        return None, None
+
+def _manifest_import_lists(conn):
+    """
+    One-time import of the legacy photo.txt / video.txt lists, keeping each line's
+    caption index. Only names are recorded here; size and sha256 stay NULL and are
+    filled in by _manifest_backfill() so hashing a large library never happens
+    inside the write transaction (or the first dashboard request).
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if conn.execute("SELECT 1 FROM meta WHERE key='imported_txt'").fetchone():
+            conn.execute("COMMIT"); return
+        count = 0
+        for kind, path in (("photo", PHOTO_LIST_PATH), ("video", VIDEO_LIST_PATH)):
+            if not os.path.exists(path): continue
+            n = 0
+            for n, name in enumerate(iter_lines(path), start=1):
+                if conn.execute("SELECT 1 FROM media WHERE type=? AND name=?", (kind, name)).fetchone():
+                    continue  # listed twice: the first line keeps its caption slot
+                conn.execute("INSERT INTO media(name,type,size,sha256,caption_index,added) VALUES (?,?,NULL,NULL,?,?)",
+                             (name, kind, n - 1, time.time()))
+                count += 1
+            # later uploads keep the caption slots the legacy list would have given them
+            conn.execute("INSERT OR REPLACE INTO meta(key,value) VALUES (?,?)", (f"caption_base_{kind}", str(n)))
+        conn.execute("INSERT INTO meta(key,value) VALUES ('imported_txt',?)", (str(time.time()),))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK"); raise
+    if count: log(f"Manifest: imported {count} entries from photo.txt / video.txt")
+
+def _manifest_backfill():
+    """
+    Background: hash imported rows that have no size yet. Each file is hashed with
+    no lock held; only the short UPDATE runs in a transaction, and only if the row
+    was not refreshed by manifest_add() in the meantime.
+    """
+    try:
+        conn = _manifest_open()
+        rows = conn.execute("SELECT id, name FROM media WHERE size IS NULL ORDER BY id").fetchall()
+        done = 0
+        for row in rows:
+            size, digest = _media_stat(row["name"])
+            if size is None: continue  # file missing
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if digest and conn.execute("SELECT 1 FROM media WHERE sha256=? AND id!=?", (digest, row["id"])).fetchone():
+                    digest = None  # same content as another row; sha256 is UNIQUE
+                done += conn.execute("UPDATE media SET size=?, sha256=? WHERE id=? AND size IS NULL",
+                                     (size, digest, row["id"])).rowcount
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK"); raise
+        conn.close()
+        if done: log(f"Manifest: hashed {done} imported entries")
+    except Exception as e:
+        log(f"Manifest backfill failed: {e}")
+
+@timed
+def manifest_add(name, digest=None):
+    """
+    Record a saved media file. Returns "added" for a new row, "updated" when an
+    existing name was re-uploaded with new content (row updated in place) and
+    None when nothing changed: the same name with the same content, or a new
+    name whose content is already in the manifest.
+    """
+    kind = _media_type(name)
+    size, digest = _media_stat(name, digest)
+    with _manifest_conn() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT id, sha256 FROM media WHERE type=? AND name=?", (kind, name)).fetchone()
+            if row:
+                if digest and row["sha256"] == digest:
+                    conn.execute("COMMIT"); return None
+                if digest and conn.execute("SELECT 1 FROM media WHERE sha256=? AND id!=?", (digest, row["id"])).fetchone():
+                    # new content duplicates another row; sha256 is UNIQUE, so drop the stale
+                    # hash rather than keep serving it (e.g. as this name's ETag)
+                    digest = None
+                conn.execute("UPDATE media SET size=?, sha256=?, added=? WHERE id=?", (size, digest, time.time(), row["id"]))
+                conn.execute("COMMIT"); return "updated"
+            if digest and conn.execute("SELECT 1 FROM media WHERE sha256=?", (digest,)).fetchone():
+                conn.execute("COMMIT"); return None
+            idx = conn.execute("SELECT COALESCE(MAX(caption_index),-1)+1 FROM media WHERE type=?", (kind,)).fetchone()[0]
+            base = conn.execute("SELECT value FROM meta WHERE key=?", (f"caption_base_{kind}",)).fetchone()
+            if base: idx = max(idx, int(base[0]))
+            conn.execute("INSERT INTO media(name,type,size,sha256,caption_index,added) VALUES (?,?,?,?,?,?)",
+                         (name, kind, size, digest, idx, time.time()))
+            conn.execute("COMMIT")
+            return "added"
+        except Exception:
+            conn.execute("ROLLBACK"); raise
+
+def manifest_entries(kind):
+    """Manifest rows of one type ('photo' / 'video') in upload order."""
+    with _manifest_conn() as conn:
+        return conn.execute("SELECT * FROM media WHERE type=? ORDER BY id", (kind,)).fetchall()
+
+def manifest_lookup(name):
+    with _manifest_conn() as conn:
+        return conn.execute("SELECT * FROM media WHERE name=? ORDER BY id DESC LIMIT 1", (name,)).fetchone()
+
+def manifest_versions(names):
+    """name -> sha256 for the given names that have a hash in the manifest (one query)."""
+    if not names: return {}
+    with _manifest_conn() as conn:
+        rows = conn.execute(f"SELECT name, sha256 FROM media WHERE sha256 IS NOT NULL AND name IN ({','.join('?' * len(names))})",
+                            list(names)).fetchall()
+    return {r["name"]: r["sha256"] for r in rows}
+
+def media_version(name):
+    """The manifest sha256 of an upload if it still describes the file on disk, else None."""
+    row = manifest_lookup(name)
+    full = os.path.join(UPLOAD_FOLDER, name)
+    if row and row["sha256"] and os.path.isfile(full) and os.path.getsize(full) == row["size"]:
+        return row["sha256"]
+    return None
+
+# ---------------------------
+# Background pre-render pipeline
+# ---------------------------
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", os.cpu_count() or 1))
+_render_pool = None
+RENDER_JOBS_KEEP = 1000  # finished jobs kept for the dashboard badges
+RENDER_TRIM_EVERY = 256  # completed jobs between ASCII cache trims while a batch is running
+_render_jobs = {}  # name -> Future, in submission order
+_render_done_count = 0
+_render_lock = Lock()
+
+def _prerender_job(path):
+    """Runs in a pool process: render into the ASCII cache and build the dashboard thumbnail."""
+    ok = cached_image_to_ascii(path, evict=False) != ASCII_FAILED
+    if ok:
+        try:
+            make_thumbnail(os.path.basename(path))
+        except Exception as e:
+            log(f"Thumbnail failed: {path}: {e}")
+    return ok
+
+def _get_render_pool(reset=False):
+    global _render_pool
+    if _render_pool is None or reset:
+        # spawn, not fork: the parent has the posting thread and request threads running
+        _render_pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _render_pool
+
+def _prune_render_jobs():
+    """Drop the oldest finished jobs beyond RENDER_JOBS_KEEP. Caller holds _render_lock."""
+    done = [n for n, f in _render_jobs.items() if f.done()]
+    for n in done[:max(len(done) - RENDER_JOBS_KEEP, 0)]:
+        del _render_jobs[n]
+
+def _prerender_done(name, fut):
+    global _render_done_count
+    try:
+        ok = fut.result()
+        log(f"Pre-render {'ready' if ok else 'failed'}: {name}")
+    except Exception as e:
+        log(f"Pre-render failed: {name}: {e}")
+    with _render_lock:
+        _render_done_count += 1
+        idle = all(f.done() for f in _render_jobs.values())
+        trim = idle or _render_done_count % RENDER_TRIM_EVERY == 0
+        _prune_render_jobs()
+    # eviction happens here in the parent, against a fresh scan of what the workers wrote
+    if trim: ascii_cache_trim()
+
+def queue_prerender(names):
+    """Queue uploaded images for rendering in the process pool; returns immediately."""
+    pool = _get_render_pool()
+    submitted = []
+    with _render_lock:
+        for name in names:
+            path = os.path.join(UPLOAD_FOLDER, name)
+            try:
+                fut = pool.submit(_prerender_job, path)
+            except BrokenProcessPool:
+                log("Render pool broken, restarting it")
+                pool = _get_render_pool(reset=True)
+                fut = pool.submit(_prerender_job, path)
+            _render_jobs.pop(name, None)  # re-queued names move to the end
+            _render_jobs[name] = fut
+            submitted.append((name, fut))
+        _prune_render_jobs()
+    # attach outside the lock: a future that is already done runs its callback right here,
+    # and _prerender_done takes _render_lock itself
+    for name, fut in submitted:
+        fut.add_done_callback(functools.partial(_prerender_done, name))
+    log(f"Queued {len(names)} images for pre-rendering ({RENDER_WORKERS} workers)")
+
+def render_states():
+    """Map of file name -> queued / rendering / ready / failed for every job this process has seen."""
+    states = {}
+    with _render_lock:
+        jobs = list(_render_jobs.items())
+    for name, fut in jobs:
+        if fut.done():
+            states[name] = "ready" if not fut.exception() and fut.result() else "failed"
+        else:
+            states[name] = "rendering" if fut.running() else "queued"
+    return states
 
 def post_text_fb(token,message):
     tags = get_tags()  # unlimited mentions/tags
@@ -121,21 +752,19 @@ def upload_video_fb(token,file_path,caption):
 def _load_comments_iter(force_reload=False):
     """
     Load comments.txt and return a cycling iterator.
-    We reload if file modified (mtime) or if iterator not created.
+    We reload if file modified (mtime/size) or if iterator not created.
     """
-    global _comments_iter, _comments_last_mtime
+    global _comments_iter, _comments_version
     try:
-        if not os.path.exists(COMMENTS_PATH):
+        version = file_version(COMMENTS_PATH)
+        if version is None:
             _comments_iter = itertools.cycle([""])  # empty comment if not present
-            _comments_last_mtime = None
+            _comments_version = None
             return _comments_iter
-        mtime = os.path.getmtime(COMMENTS_PATH)
-        if force_reload or _comments_iter is None or _comments_last_mtime != mtime:
-            lines = [l.strip() for l in open(COMMENTS_PATH,"r",encoding="utf-8") if l.strip()]
-            if not lines:
-                lines = [""]
+        if force_reload or _comments_iter is None or _comments_version != version:
+            lines = load_lines(COMMENTS_PATH, fresh=force_reload) or ("",)
             _comments_iter = itertools.cycle(lines)
-            _comments_last_mtime = mtime
+            _comments_version = version
             log(f"Comments loaded ({len(lines)} lines).")
     except Exception as e:
         log(f"Failed to load comments: {e}")
@@ -214,16 +843,19 @@ def posting_worker(post_type,delay_seconds):
                     time.sleep(delay_seconds)
 
         elif post_type=="photo":
-            media_entries=load_lines(PHOTO_LIST_PATH)
+            media_entries=manifest_entries("photo")
             captions=load_lines(CAPTION_PATH)
             pairs=[]
-            for i,name in enumerate(media_entries):
+            hits0,misses0=ascii_cache_stats["hits"],ascii_cache_stats["misses"]
+            for row in media_entries:
+                name,i=row["name"],row["caption_index"]
                 full=os.path.join(UPLOAD_FOLDER,name)
                 if os.path.exists(full):
                     caption=captions[i] if i<len(captions) else ""
-                    ascii_text = image_to_ascii(full)
+                    ascii_text = cached_image_to_ascii(full)
                     pairs.append({'text':ascii_text,'caption':caption})
                 else: log(f"Missing media file: {name}")
+            log(f"ASCII cache: {ascii_cache_stats['hits']-hits0} hits, {ascii_cache_stats['misses']-misses0} misses")
             if not pairs: log("No valid media found. Stopping worker."); return
             while is_running:
                 for item in pairs:
@@ -249,10 +881,11 @@ def posting_worker(post_type,delay_seconds):
                     time.sleep(delay_seconds)
 
         elif post_type=="video":
-            media_entries=load_lines(VIDEO_LIST_PATH)
+            media_entries=manifest_entries("video")
             captions=load_lines(CAPTION_PATH)
             pairs=[]
-            for i,name in enumerate(media_entries):
+            for row in media_entries:
+                name,i=row["name"],row["caption_index"]
                 full=os.path.join(UPLOAD_FOLDER,name)
                 if os.path.exists(full):
                     caption=captions[i] if i<len(captions) else ""
@@ -382,6 +1015,11 @@ pre { background: rgba(0,0,0,0.35); color: #d9fff0; padding:12px; border-radius:
 /* file list */
 .file-list li { margin-bottom:6px; }
 .badge-video { background: linear-gradient(90deg,#ff7a7a,#ffb26b); color:#001; border-radius:999px; padding:4px 8px; }
+.file-list .thumb { width:48px; height:48px; object-fit:cover; border-radius:6px; vertical-align:middle; }
+.badge-render { border-radius:999px; padding:4px 8px; font-size:0.75rem; color:#001; background:rgba(255,255,255,0.5); }
+.badge-render.ready { background: var(--accent1); }
+.badge-render.rendering { background: var(--accent2); }
+.badge-render.failed { background: #ff7a7a; }
 
 /* controls */
 .controls .btn { border-radius:10px; padding:10px 14px; }
@@ -443,21 +1081,30 @@ pre { background: rgba(0,0,0,0.35); color: #d9fff0; padding:12px; border-radius:
           </div>
 
           <div class="tab-pane fade" id="media">
-            <form method="POST" action="/upload_media" enctype="multipart/form-data">
+            <form method="POST" action="/upload_media" enctype="multipart/form-data" id="media-form">
               <input type="file" name="media_files" multiple class="form-control mb-2">
               <button type="submit" class="btn btn-light w-100 controls">Upload Media</button>
             </form>
+            <div class="small-muted mt-2" id="media-progress"></div>
             <h6 class="mt-3">Uploaded Files</h6>
-            <ul class="file-list">
+            <div class="small-muted mb-2">{{files_total}} files</div>
+            <ul class="file-list" id="file-list">
               {% for f in files %}
                 <li>
-                  <a href="/uploads/{{f}}" target="_blank">{{f}}</a>
-                  {% if f.lower().endswith(('.mp4','.mov','.mkv','.avi')) %}
+                  {% if f.thumb %}<img class="thumb me-2" src="/thumbs/{{f.name}}{% if f.v %}?v={{f.v}}{% endif %}" loading="lazy" alt="">{% endif %}
+                  <a href="/uploads/{{f.name}}{% if f.v %}?v={{f.v}}{% endif %}" target="_blank">{{f.name}}</a>
+                  {% if f.video %}
                     <span class="badge-video ms-2">VIDEO</span>
                   {% endif %}
+                  {% if f.state %}
+                    <span class="badge-render ms-2 {{f.state}}">{{f.state}}</span>
+                  {% endif %}
                 </li>
               {% endfor %}
             </ul>
+            {% if next_page %}
+              <button type="button" id="files-more" class="btn btn-outline-light w-100" data-page="{{next_page}}">Load more</button>
+            {% endif %}
           </div>
 
           <div class="tab-pane fade" id="captions">
@@ -486,7 +1133,7 @@ pre { background: rgba(0,0,0,0.35); color: #d9fff0; padding:12px; border-radius:
           </div>
 
           <div class="tab-pane fade" id="logs">
-            <pre>{% for l in logs %}{{l}}\n{% endfor %}</pre>
+            <pre id="log-feed" data-seq="{{log_seq}}">{% for l in logs %}{{l}}\n{% endfor %}</pre>
           </div>
         </div>
       </div>
@@ -535,18 +1182,206 @@ pre { background: rgba(0,0,0,0.35); color: #d9fff0; padding:12px; border-radius:
 </div>
 
 <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
+<script>
+// fetch further pages of the media list from /files
+(function(){
+  const btn = document.getElementById("files-more");
+  if (!btn) return;
+  const list = document.getElementById("file-list");
+  btn.addEventListener("click", async function(){
+    const r = await fetch("/files?page=" + btn.dataset.page);
+    const data = await r.json();
+    for (const f of data.files) {
+      const li = document.createElement("li");
+      const a = document.createElement("a");
+      a.href = "/uploads/" + encodeURIComponent(f.name) + (f.v ? "?v=" + f.v : ""); a.target = "_blank"; a.textContent = f.name;
+      if (f.thumb) { const img = document.createElement("img"); img.className = "thumb me-2"; img.loading = "lazy"; img.alt = ""; img.src = "/thumbs/" + encodeURIComponent(f.name) + (f.v ? "?v=" + f.v : ""); li.appendChild(img); }
+      li.appendChild(a);
+      if (f.video) { const b = document.createElement("span"); b.className = "badge-video ms-2"; b.textContent = "VIDEO"; li.appendChild(b); }
+      if (f.state) { const b = document.createElement("span"); b.className = "badge-render ms-2 " + f.state; b.textContent = f.state; li.appendChild(b); }
+      list.appendChild(li);
+    }
+    if (data.next_page) btn.dataset.page = data.next_page; else btn.remove();
+  });
+})();
+
+// chunked, resumable media upload (plain form post is the no-JS fallback)
+(function(){
+  const form = document.getElementById("media-form");
+  const progress = document.getElementById("media-progress");
+  const CHUNK = 8 * 1024 * 1024;
+  // JSON call; HTTP errors are fatal (no retry), except an offset-mismatch 409 on PUT, which resyncs
+  async function call(url, opts, resync){
+    const r = await fetch(url, opts);
+    const data = await r.json().catch(() => ({}));
+    if (!r.ok && !(resync && r.status === 409 && typeof data.offset === "number")) {
+      const err = new Error(data.error || ("HTTP " + r.status)); err.fatal = true; throw err;
+    }
+    return data;
+  }
+  async function send(file){
+    const id = (await call("/upload_chunked/init", {method:"POST", headers:{"Content-Type":"application/json"},
+                                                    body: JSON.stringify({filename:file.name, size:file.size})})).upload_id;
+    let offset = 0, retries = 0;
+    while (offset < file.size) {
+      try {
+        offset = (await call("/upload_chunked/" + id + "?offset=" + offset, {method:"PUT", body:file.slice(offset, offset + CHUNK)}, true)).offset;
+        retries = 0;
+      } catch (e) {
+        if (e.fatal || ++retries > 5) throw e;
+        await new Promise(res => setTimeout(res, 1000 * retries));
+        offset = (await call("/upload_chunked/" + id)).offset;  // resume from acknowledged offset
+      }
+      progress.textContent = file.name + ": " + Math.floor(100 * offset / file.size) + "%";
+    }
+    await call("/upload_chunked/" + id + "/finalize", {method:"POST"});
+  }
+  form.addEventListener("submit", async function(ev){
+    ev.preventDefault();
+    let file;
+    try {
+      for (file of form.media_files.files) await send(file);
+    } catch (e) {
+      progress.textContent = "Upload failed" + (file ? " (" + file.name + ")" : "") + ": " + e.message;
+      return;
+    }
+    location.reload();
+  });
+})();
+
+// poll /logs for new entries and prepend them instead of reloading the page
+(function(){
+  const feed = document.getElementById("log-feed");
+  let seq = parseInt(feed.dataset.seq || "0", 10);
+  async function poll(){
+    try {
+      const r = await fetch("/logs?since=" + seq);
+      const data = await r.json();
+      if (data.reset) feed.textContent = "";
+      for (const e of data.entries) feed.textContent = e.entry + "\n" + feed.textContent;
+      if (data.entries.length) {
+        const lines = feed.textContent.split("\n");
+        if (lines.length > {{log_capacity}} + 1) feed.textContent = lines.slice(0, {{log_capacity}}).join("\n") + "\n";
+      }
+      seq = data.seq;
+    } catch (e) {}
+    setTimeout(poll, 3000);
+  }
+  setTimeout(poll, 3000);
+})();
+</script>
 </body>
 </html>
 """
 
+# compiled once at import instead of on every request
+INDEX_TEMPLATE = app.jinja_env.from_string(INDEX_HTML)
+
+# ---------------------------
+# Uploads directory index
+# ---------------------------
+_files_index = {'mtime': None, 'files': []}
+_files_index_lock = Lock()
+
+def invalidate_files_index():
+    with _files_index_lock:
+        _files_index['mtime'] = None
+
+def list_upload_files():
+    """
+    Sorted (newest name first) listing of UPLOAD_FOLDER, rebuilt only when the
+    folder's mtime changes or an upload route invalidates it. Dot-entries such as
+    the ASCII cache are internal and skipped.
+    """
+    mtime = os.stat(UPLOAD_FOLDER).st_mtime_ns
+    with _files_index_lock:
+        if _files_index['mtime'] != mtime:
+            _files_index['files'] = sorted((n for n in os.listdir(UPLOAD_FOLDER) if not n.startswith('.')), reverse=True)
+            _files_index['mtime'] = mtime
+        return _files_index['files']
+
+def files_page(page=1, per_page=FILES_PAGE_SIZE):
+    files = list_upload_files()
+    page = max(page, 1); per_page = max(min(per_page, 1000), 1)
+    chunk = files[(page-1)*per_page:page*per_page]
+    states = render_states()
+    versions = manifest_versions(chunk)
+    items = [{'name': n, 'video': n.lower().endswith(VIDEO_EXTS), 'thumb': n.lower().endswith(IMAGE_EXTS),
+              'state': states.get(n), 'v': versions.get(n)} for n in chunk]
+    return items, len(files), (page+1 if page*per_page < len(files) else None)
+
 @app.route("/")
 def index():
-    files=sorted(os.listdir(UPLOAD_FOLDER),reverse=True)
-    return render_template_string(INDEX_HTML, files=files, status=current_status, logs=recent_logs, upload_folder=UPLOAD_FOLDER)
+    files,total,next_page=files_page()
+    entries=logs_since()
+    ctx=dict(files=files, files_total=total, next_page=next_page, status=current_status, logs=[e for _,e in reversed(entries)],
+             log_seq=entries[-1][0] if entries else 0, log_capacity=LOG_CAPACITY, upload_folder=UPLOAD_FOLDER)
+    app.update_template_context(ctx)
+    return INDEX_TEMPLATE.render(ctx)
+
+@app.route("/files")
+def files_index():
+    items,total,next_page=files_page(request.args.get("page",1,type=int), request.args.get("per_page",FILES_PAGE_SIZE,type=int))
+    return jsonify(files=items, total=total, next_page=next_page)
+
+@app.route("/logs")
+def logs():
+    since=request.args.get("since",0,type=int)
+    with _log_lock:
+        latest=recent_logs[-1][0] if recent_logs else 0
+    # a cursor ahead of the server means it restarted: send the whole buffer and tell the client to reset
+    reset=since>latest
+    entries=logs_since(0 if reset else since)
+    return jsonify(seq=entries[-1][0] if entries else latest, reset=reset, entries=[{'seq':n,'entry':e} for n,e in entries])
+
+@app.route("/metrics")
+def metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/render_status")
+def render_status():
+    return jsonify(render_states())
 
 @app.route("/uploads/<path:filename>")
 def uploaded(filename):
-    return send_from_directory(UPLOAD_FOLDER, filename, as_attachment=False)
+    """
+    Serve an upload with Range support (video seeking) and conditional GETs.
+    Media in the manifest gets its sha256 as a strong ETag. Names can be reused,
+    so only URLs carrying the current ?v=<sha256> are cached long-term; everything
+    else is no-cache and revalidated. The body goes out through wsgi.file_wrapper,
+    which gunicorn turns into sendfile().
+    """
+    # dot-entries (manifest, partial uploads, caches, profiles) are internal, as in the listing
+    if any(part.startswith(".") for part in filename.replace("\\", "/").split("/")):
+        abort(404)
+    version = media_version(filename)
+    if version and request.args.get("v") == version:
+        return send_from_directory(UPLOAD_FOLDER, filename, as_attachment=False, conditional=True,
+                                   etag=version, max_age=MEDIA_MAX_AGE)
+    rv = send_from_directory(UPLOAD_FOLDER, filename, as_attachment=False, conditional=True, etag=version or True)
+    rv.cache_control.no_cache = True
+    return rv
+
+@app.route("/thumbs/<path:name>")
+def thumbs(name):
+    """Dashboard thumbnail for an uploaded image, generated on first request and cached on disk."""
+    if name != secure_filename(name):
+        abort(404)
+    try:
+        path = make_thumbnail(name)
+    except Exception as e:
+        log(f"Thumbnail failed: {name}: {e}")
+        abort(404)
+    if path is None:
+        abort(404)
+    # like /uploads: long-lived only when the URL carries the source's current version
+    version = media_version(name)
+    thumb = os.path.relpath(path, THUMB_DIR)
+    if version and request.args.get("v") == version:
+        return send_from_directory(THUMB_DIR, thumb, conditional=True, max_age=MEDIA_MAX_AGE)
+    rv = send_from_directory(THUMB_DIR, thumb, conditional=True)
+    rv.cache_control.no_cache = True
+    return rv
 
 @app.route("/upload_tokens", methods=["POST"])
 def upload_tokens():
@@ -570,26 +1405,180 @@ def upload_text():
 def upload_media():
     files=request.files.getlist("media_files")
     saved_names=[]
-    video_exts = ('.mp4','.mov','.mkv','.avi')
-    saved_videos=[]
-    saved_photos=[]
     for f in files:
         if f and f.filename:
             name=secure_filename(f.filename)
             f.save(os.path.join(UPLOAD_FOLDER,name))
             saved_names.append(name)
             log(f"Saved media file: {name}")
-            if name.lower().endswith(video_exts):
-                saved_videos.append(name)
-            else:
-                saved_photos.append(name)
+    register_media(saved_names)
+    return redirect(url_for("index"))
+
+def register_media(saved_names, digests=None):
+    """
+    Record newly saved media files in the manifest (mirrored to photo.txt /
+    video.txt) and queue new photos for pre-rendering. `digests` maps name ->
+    sha256 when the caller already hashed the file.
+    """
+    digests=digests or {}
+    if saved_names: invalidate_files_index()
+    results={n: manifest_add(n, digests.get(n)) for n in saved_names}
+    dupes=[n for n,r in results.items() if r is None]
+    if dupes: log(f"Manifest: skipped {len(dupes)} duplicate files: {', '.join(dupes[:5])}")
+    added=[n for n,r in results.items() if r=="added"]
+    saved_videos=[n for n in added if n.lower().endswith(VIDEO_EXTS)]
+    saved_photos=[n for n in added if not n.lower().endswith(VIDEO_EXTS)]
     if saved_photos:
         append_list_file(PHOTO_LIST_PATH,saved_photos)
         log(f"Appended {len(saved_photos)} files to {PHOTO_LIST_PATH}")
+    changed_photos=[n for n,r in results.items() if r and not n.lower().endswith(VIDEO_EXTS)]
+    if changed_photos:
+        queue_prerender(changed_photos)
     if saved_videos:
         append_list_file(VIDEO_LIST_PATH,saved_videos)
         log(f"Appended {len(saved_videos)} files to {VIDEO_LIST_PATH}")
-    return redirect(url_for("index"))
+
+# ---------------------------
+# Chunked (resumable) media uploads
+# ---------------------------
+# init -> PUT chunks at the acknowledged offset -> finalize. The body of each PUT
+# is streamed straight onto <id>.part, which is renamed into UPLOAD_FOLDER on
+# finalize, so a file is written exactly once. The part file's size is the
+# acknowledged offset, so clients resume with GET /upload_chunked/<id>.
+_chunked = {}  # upload_id -> {'lock', 'hash', 'hashed'}; sha256 state for this process
+_chunked_lock = Lock()
+
+def _chunked_paths(upload_id):
+    if not re.fullmatch(r"[0-9a-f]{32}", upload_id or ""):
+        return None
+    base = os.path.join(CHUNKED_DIR, upload_id)
+    return base + ".part", base + ".json"
+
+def _chunked_state(upload_id):
+    with _chunked_lock:
+        st = _chunked.get(upload_id)
+        if st is None:
+            st = _chunked[upload_id] = {'lock': Lock(), 'hash': hashlib.sha256(), 'hashed': 0}
+        return st
+
+def _chunked_meta(upload_id):
+    paths = _chunked_paths(upload_id)
+    if not paths or not os.path.exists(paths[1]):
+        return None, None
+    with open(paths[1], "r", encoding="utf-8") as f:
+        return paths, json.load(f)
+
+def _chunked_sweep():
+    """Remove partial uploads (and their hash state) that have not been written to for CHUNKED_MAX_AGE."""
+    cutoff = time.time() - CHUNKED_MAX_AGE
+    try:
+        entries = list(os.scandir(CHUNKED_DIR))
+    except FileNotFoundError:
+        return
+    latest = {}
+    for e in entries:
+        upload_id = e.name.split(".", 1)[0]
+        try:
+            latest[upload_id] = max(latest.get(upload_id, 0), e.stat().st_mtime)
+        except OSError: pass
+    for upload_id, mtime in latest.items():
+        if mtime >= cutoff: continue
+        for e in entries:
+            if e.name.split(".", 1)[0] == upload_id:
+                try: os.remove(e.path)
+                except OSError: pass
+        with _chunked_lock:
+            _chunked.pop(upload_id, None)
+        log(f"Discarded abandoned chunked upload {upload_id}")
+
+@app.route("/upload_chunked/init", methods=["POST"])
+def upload_chunked_init():
+    data = request.get_json(silent=True) or request.form
+    name = secure_filename(data.get("filename", ""))
+    if not name:
+        return jsonify(error="filename required"), 400
+    size = data.get("size")
+    if size in (None, ""):
+        size = None
+    else:
+        try:
+            size = int(size)
+        except (TypeError, ValueError):
+            return jsonify(error="size must be an integer"), 400
+        if size < 0:
+            return jsonify(error="size must be an integer"), 400
+    _chunked_sweep()
+    os.makedirs(CHUNKED_DIR, exist_ok=True)
+    upload_id = secrets.token_hex(16)
+    part, meta = _chunked_paths(upload_id)
+    open(part, "wb").close()
+    with open(meta, "w", encoding="utf-8") as f:
+        json.dump({'name': name, 'size': size}, f)
+    log(f"Chunked upload started: {name} ({upload_id})")
+    return jsonify(upload_id=upload_id, offset=0)
+
+@app.route("/upload_chunked/<upload_id>", methods=["GET"])
+def upload_chunked_status(upload_id):
+    paths, meta = _chunked_meta(upload_id)
+    if not meta:
+        return jsonify(error="unknown upload"), 404
+    return jsonify(upload_id=upload_id, name=meta['name'], size=meta['size'], offset=os.path.getsize(paths[0]))
+
+@app.route("/upload_chunked/<upload_id>", methods=["PUT"])
+def upload_chunked_put(upload_id):
+    paths, meta = _chunked_meta(upload_id)
+    if not meta:
+        return jsonify(error="unknown upload"), 404
+    offset = request.args.get("offset", type=int)
+    st = _chunked_state(upload_id)
+    with st['lock']:
+        current = os.path.getsize(paths[0])
+        if offset != current:
+            return jsonify(error="offset mismatch", offset=current), 409
+        limit = meta['size']
+        if limit is not None and request.content_length is not None and current + request.content_length > limit:
+            return jsonify(error="chunk exceeds declared size", offset=current, size=limit), 413
+        if st['hashed'] != current:
+            st['hash'] = None  # started in another process or before a restart; rehash on finalize
+        with open(paths[0], "ab") as f:
+            written = current
+            for chunk in iter(lambda: request.stream.read(1024 * 1024), b""):
+                if limit is not None and written + len(chunk) > limit:
+                    # no Content-Length (chunked transfer): roll back this request's bytes
+                    f.truncate(current)
+                    st['hash'] = None
+                    return jsonify(error="chunk exceeds declared size", offset=current, size=limit), 413
+                f.write(chunk); written += len(chunk)
+                if st['hash'] is not None:
+                    st['hash'].update(chunk); st['hashed'] += len(chunk)
+        return jsonify(upload_id=upload_id, offset=os.path.getsize(paths[0]))
+
+@app.route("/upload_chunked/<upload_id>/finalize", methods=["POST"])
+def upload_chunked_finalize(upload_id):
+    paths, meta = _chunked_meta(upload_id)
+    if not meta:
+        return jsonify(error="unknown upload"), 404
+    st = _chunked_state(upload_id)
+    with st['lock']:
+        size = os.path.getsize(paths[0])
+        if meta['size'] is not None and size > meta['size']:
+            # can never finalize; drop it instead of leaving it for the sweep
+            for p in paths:
+                try: os.remove(p)
+                except OSError: pass
+            with _chunked_lock: _chunked.pop(upload_id, None)
+            log(f"Chunked upload {upload_id} discarded: {size} bytes exceeds declared {meta['size']}")
+            return jsonify(error="upload exceeds declared size", offset=size, size=meta['size']), 413
+        if meta['size'] is not None and size != meta['size']:
+            return jsonify(error="incomplete upload", offset=size, size=meta['size']), 409
+        digest = st['hash'].hexdigest() if st['hash'] is not None and st['hashed'] == size else file_digest(paths[0])
+        os.replace(paths[0], os.path.join(UPLOAD_FOLDER, meta['name']))
+        os.remove(paths[1])
+    with _chunked_lock:
+        _chunked.pop(upload_id, None)
+    log(f"Saved media file: {meta['name']} ({size} bytes, sha256 {digest[:12]})")
+    register_media([meta['name']], {meta['name']: digest})
+    return jsonify(name=meta['name'], size=size, sha256=digest)
 
 @app.route("/upload_captions", methods=["POST"])
 def upload_captions():
@@ -0,0 +1,208 @@
+"""
+Offline benchmarks for the app's local hot paths.
+
+Everything runs against generated fixtures in a throwaway directory through
+Flask's test client; nothing touches the network or the real uploads folder.
+Results are written as JSON so two commits can be compared:
+
+    python benchmarks/run.py --output before.json
+    git checkout other-branch
+    python benchmarks/run.py --output after.json
+
+--quick shrinks the fixture sizes for a fast smoke run.
+"""
+import argparse, atexit, contextlib, io, json, os, platform, shutil, statistics, subprocess, sys, tempfile, threading, time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# app.py creates uploads/ relative to cwd on import, so import it from a scratch dir
+_import_dir = tempfile.mkdtemp(prefix="autopost-bench-import-")
+atexit.register(shutil.rmtree, _import_dir, True)
+_cwd = os.getcwd()
+os.chdir(_import_dir)
+sys.path.insert(0, REPO)
+import app
+from PIL import Image
+os.chdir(_cwd)
+
+BENCHES = []
+
+def bench(fn):
+    BENCHES.append(fn)
+    return fn
+
+def measure(fn, repeat, setup=None):
+    """Run fn `repeat` times and return timing stats in seconds."""
+    times = []
+    for _ in range(repeat):
+        if setup: setup()
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    times.sort()
+    return {
+        "repeat": repeat,
+        "min": times[0],
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+        "p95": times[min(len(times) - 1, int(len(times) * 0.95))],
+    }
+
+@contextlib.contextmanager
+def workdir():
+    """Fresh cwd with an empty uploads/ folder; the app resolves its paths against cwd at call time."""
+    old = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="autopost-bench-") as d:
+        os.makedirs(os.path.join(d, "uploads"))
+        os.chdir(d)
+        app._manifest_close()
+        app.invalidate_files_index()
+        try:
+            yield d
+        finally:
+            app._manifest_close()
+            os.chdir(old)
+
+def make_image(path, size, fmt):
+    img = Image.effect_noise(size, 64).convert("RGB")
+    img.save(path, fmt, **({"quality": 90} if fmt == "JPEG" else {}))
+
+# ---------------------------
+# Benchmarks
+# ---------------------------
+@bench
+def image_to_ascii(quick):
+    sizes = [(640, 480), (1920, 1080)] + ([] if quick else [(4000, 3000)])
+    results = []
+    with workdir():
+        for w, h in sizes:
+            for fmt, ext in (("JPEG", ".jpg"), ("PNG", ".png")):
+                path = f"uploads/img_{w}x{h}{ext}"
+                make_image(path, (w, h), fmt)
+                for width in (80, 160):
+                    for fast in (True, False):
+                        stats = measure(lambda: app.image_to_ascii(path, width, fast_decode=fast), 3 if quick else 10)
+                        results.append({"params": {"size": f"{w}x{h}", "format": fmt, "width": width, "fast_decode": fast}, **stats})
+    return results
+
+@bench
+def log_throughput(quick):
+    per_thread = 2000 if quick else 20000
+    results = []
+    for threads in (1, 4, 16):
+        def run():
+            ts = [threading.Thread(target=lambda: [app.log("bench message") for _ in range(per_thread)]) for _ in range(threads)]
+            for t in ts: t.start()
+            for t in ts: t.join()
+        stats = measure(run, 3)
+        results.append({"params": {"threads": threads, "messages": threads * per_thread},
+                        "msgs_per_sec": threads * per_thread / stats["median"], **stats})
+    return results
+
+@bench
+def index_render(quick):
+    counts = (10, 1000, 10000) if quick else (10, 1000, 10000, 100000)
+    client = app.app.test_client()
+    results = []
+    for n in counts:
+        with workdir():
+            for i in range(n):
+                open(f"uploads/file_{i:06d}.jpg", "wb").close()
+            cold = measure(lambda: client.get("/"), 3, setup=app.invalidate_files_index)
+            warm = measure(lambda: client.get("/"), 5 if quick else 20)
+            page = measure(lambda: client.get("/files?page=2"), 5 if quick else 20)
+            results.append({"params": {"files": n, "case": "cold"}, **cold})
+            results.append({"params": {"files": n, "case": "warm"}, **warm})
+            results.append({"params": {"files": n, "case": "files_page_2"}, **page})
+    return results
+
+@bench
+def list_append(quick):
+    sizes = (1000, 10000) if quick else (1000, 10000, 100000)
+    appends = 50 if quick else 200
+    results = []
+    for n in sizes:
+        with workdir():
+            with open("uploads/photo.txt", "w", encoding="utf-8") as f:
+                f.write("".join(f"seed_{i}.jpg\n" for i in range(n)))
+            counter = iter(range(10 ** 9))
+            stats = measure(lambda: app.append_list_file("uploads/photo.txt", [f"new_{next(counter)}.jpg"]), appends)
+            results.append({"params": {"existing": n, "op": "append_list_file"}, **stats})
+
+            with app._manifest_conn() as conn:  # imports photo.txt once
+                conn.execute("BEGIN")
+                conn.executemany("INSERT INTO media(name,type,size,sha256,caption_index,added) VALUES (?,?,?,?,?,?)",
+                                 ((f"row_{i}.jpg", "photo", 1, f"{i:064x}", n + i, 0.0) for i in range(n)))
+                conn.execute("COMMIT")
+            def add():
+                name = f"m_{next(counter)}.jpg"
+                with open(os.path.join("uploads", name), "wb") as f: f.write(name.encode())
+                app.manifest_add(name)
+            stats = measure(add, appends)
+            results.append({"params": {"existing": n, "op": "manifest_add"}, **stats})
+    return results
+
+@bench
+def upload_media(quick):
+    sizes_mb = (8, 32) if quick else (32, 256)
+    client = app.app.test_client()
+    results = []
+    for mb in sizes_mb:
+        base = os.urandom(1024 * 1024) * mb
+        with workdir():
+            counter = iter(range(10 ** 9))
+            cur = {}
+            def next_payload():
+                # unique content per iteration (outside the timed region), otherwise every
+                # upload after the first takes the manifest's duplicate-skip path
+                cur["n"] = next(counter)
+                cur["data"] = cur["n"].to_bytes(8, "big") + base[8:]
+            def form_upload():
+                client.post("/upload_media", content_type="multipart/form-data",
+                            data={"media_files": [(io.BytesIO(cur["data"]), f"v{cur['n']}.mp4")]})
+            stats = measure(form_upload, 3, setup=next_payload)
+            results.append({"params": {"size_mb": mb, "api": "form"}, "mb_per_sec": mb / stats["median"], **stats})
+
+            chunk = 8 * 1024 * 1024
+            def chunked_upload():
+                payload = cur["data"]
+                uid = client.post("/upload_chunked/init", json={"filename": f"c{cur['n']}.mp4", "size": len(payload)}).json["upload_id"]
+                for off in range(0, len(payload), chunk):
+                    client.put(f"/upload_chunked/{uid}?offset={off}", data=payload[off:off + chunk])
+                client.post(f"/upload_chunked/{uid}/finalize")
+            stats = measure(chunked_upload, 3, setup=next_payload)
+            results.append({"params": {"size_mb": mb, "api": "chunked"}, "mb_per_sec": mb / stats["median"], **stats})
+    return results
+
+# ---------------------------
+# Runner
+# ---------------------------
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="smaller fixtures for a fast smoke run")
+    parser.add_argument("--only", action="append", choices=[b.__name__ for b in BENCHES], help="run only these benchmarks")
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    report = {"commit": git_commit(), "python": platform.python_version(), "platform": platform.platform(),
+              "quick": args.quick, "started": time.strftime("%Y-%m-%dT%H:%M:%S"), "benchmarks": {}}
+    for b in BENCHES:
+        if args.only and b.__name__ not in args.only: continue
+        print(f"running {b.__name__}...", file=sys.stderr)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):  # app.log() prints every line
+            report["benchmarks"][b.__name__] = b(args.quick)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f: f.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()